@@ -1,87 +1,161 @@
 import streamlit as st
 import numpy as np
-from PIL import Image
-import gdown
+import logging
+import math
 import os
-from tensorflow.lite.python.interpreter import Interpreter
-import tensorflow as tf
-import numpy as np
+import threading
+from model_download import download_model, file_sha256
+from preprocessing import decode_image
+
+# يجب أن يكون أول أمر Streamlit في الملف
+st.set_page_config(page_title="Plant Diagnosis", layout="centered")
 
-def run_tflite_model(model_path):
-    # تحميل موديل TFLite
-    interpreter = tf.lite.Interpreter(model_path=model_path)
-    interpreter.allocate_tensors()
+# تحميل النموذج tflite من Google Drive إذا لم يكن موجودًا
+MODEL_PATH = "model.tflite"
+MODEL_URL = "https://drive.google.com/uc?id=1ECiRuPbY6m7gniTKIupGleiIuhgWdEce"
+# البصمة المتوقعة للنموذج: تُثبَّت هنا ويمكن تجاوزها بمتغير البيئة MODEL_SHA256.
+# ما زالت فارغة لأن ملف Drive الحالي لم يُحسب له بصمة بعد؛ بدونها لا يُتحقق من الملف ولا يُستكمل تنزيل منقطع
+PINNED_MODEL_SHA256 = ""
+MODEL_SHA256 = os.environ.get("MODEL_SHA256", PINNED_MODEL_SHA256)
 
-    # الحصول على تفاصيل الإدخال والإخراج
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
+logger = logging.getLogger(__name__)
 
-    print("Input details:", input_details)
-    print("Output details:", output_details)
+# بصمة النموذج تُحسب مرة واحدة لكل نسخة من الملف (حسب وقت التعديل) وليس عند كل rerun
+@st.cache_data(show_spinner=False)
+def model_sha256(path, mtime):
+    return file_sha256(path)
 
-    # تجهيز بيانات عشوائية طبقاً لشكل الإدخال (يمكنك استبدالها ببيانات حقيقية)
-    input_shape = input_details[0]['shape']
-    input_dtype = input_details[0]['dtype']
-    input_data = np.array(np.random.random_sample(input_shape), dtype=input_dtype)
+# قفل مشترك حتى لا تنزّل جلستان النموذج في نفس الوقت
+@st.cache_resource
+def get_download_lock():
+    return threading.Lock()
 
-    # تعيين البيانات للإدخال
-    interpreter.set_tensor(input_details[0]['index'], input_data)
+def fetch_model(url, path, sha256):
+    with get_download_lock():
+        if os.path.exists(path) and (not sha256 or model_sha256(path, os.path.getmtime(path)) == sha256):
+            return False
+        download_model(url, path, sha256)
+        return True
 
-    # تشغيل التنبؤ
-    interpreter.invoke()
+try:
+    if fetch_model(MODEL_URL, MODEL_PATH, MODEL_SHA256):
+        st.success("✅ Model downloaded successfully.")
+except Exception as e:
+    st.error(f"❌ Failed to download model: {e}")
+    st.stop()
 
-    # استخراج النتائج من الإخراج
-    output_data = interpreter.get_tensor(output_details[0]['index'])
-    print("Output data:", output_data)
+# عدد الأنوية المتاحة فعليًا للحاوية (قد يكون أقل من os.cpu_count()): sched_getaffinity يعكس
+# تثبيت الأنوية (cpuset)، وحصة CFS (مثل --cpus) تُقرأ من cgroup v2 (cpu.max) أو cgroup v1 (cfs_quota_us)
+def available_cpus():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+    except OSError:
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = f.read().strip()
+        except OSError:
+            return cpus
+    try:
+        if quota not in ("max", "-1"):
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except ValueError:
+        pass
+    return cpus
 
-if __name__ == "__main__":
-    # ضع هنا مسار ملف نموذج TFLite لديك
-    model_file = "model.tflite"
+# مسار مكتبة GPU delegate (اختياري): لا تأتي مع ai-edge-litert ولا tensorflow، وتُبنى من مصدر
+# TensorFlow (//tensorflow/lite/delegates/gpu:libtensorflowlite_gpu_delegate.so)، ويفيد معها نموذج float16
+GPU_DELEGATE_PATH = os.environ.get("TFLITE_GPU_DELEGATE", "")
 
-    run_tflite_model(model_file)
+def build_interpreter(Interpreter, load_delegate, path, num_threads):
+    # على المعالج افتراضيًا؛ XNNPACK مفعّل افتراضيًا في Interpreter ويستخدم num_threads
+    if GPU_DELEGATE_PATH:
+        try:
+            gpu_delegate = load_delegate(GPU_DELEGATE_PATH)
+            itp = Interpreter(model_path=path, experimental_delegates=[gpu_delegate], num_threads=num_threads)
+        except (OSError, ValueError, RuntimeError) as e:
+            logger.warning("GPU delegate %s unavailable, running on CPU: %s", GPU_DELEGATE_PATH, e)
+            itp = Interpreter(model_path=path, num_threads=num_threads)
+    else:
+        itp = Interpreter(model_path=path, num_threads=num_threads)
+    # تثبيت شكل الإدخال (1, 256, 256, 3) قبل تخصيص الذاكرة، حتى لو كان النموذج بأبعاد ديناميكية
+    itp.resize_tensor_input(itp.get_input_details()[0]['index'], (1, 256, 256, 3), strict=True)
+    itp.allocate_tensors()
+    return itp
 
-# تحميل النموذج tflite من Google Drive إذا لم يكن موجودًا
-MODEL_PATH = "model.tflite"
-if not os.path.exists(MODEL_PATH):
-    file_id = "1ECiRuPbY6m7gniTKIupGleiIuhgWdEce"
-    url = f"https://drive.google.com/uc?id={file_id}"
+# تحميل النموذج باستخدام Interpreter مرة واحدة فقط (لا يُعاد عند كل rerun)
+# المفسّر مشترك بين كل الجلسات وهو غير آمن للخيوط، لذلك يُخزَّن معه قفل (lock)
+@st.cache_resource
+def get_interpreter(path):
+    # LiteRT الخفيف، أو tensorflow حيث لا توجد له عجلة (الاستيراد هنا ليُحمَّل مرة واحدة فقط)
     try:
-        gdown.download(url, MODEL_PATH, quiet=False)
-        st.success("✅ Model downloaded successfully.")
-    except Exception as e:
-        st.error(f"❌ Failed to download model: {e}")
-        st.stop()
+        from ai_edge_litert.interpreter import Interpreter, load_delegate
+    except ImportError as e:
+        try:
+            from tensorflow.lite.python.interpreter import Interpreter, load_delegate
+        except ImportError:
+            raise ImportError("Install ai-edge-litert (or tensorflow) to run the model") from e
+    itp = build_interpreter(Interpreter, load_delegate, path, available_cpus())
+    return itp, itp.get_input_details(), itp.get_output_details(), threading.Lock()
 
-# تحميل النموذج باستخدام Interpreter
-interpreter = Interpreter(model_path=MODEL_PATH)
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
+interpreter, input_details, output_details, interpreter_lock = get_interpreter(MODEL_PATH)
 
 # واجهة Streamlit
-st.set_page_config(page_title="Plant Diagnosis", layout="centered")
 st.title("🌿 Plant Nutrient Diagnosis App")
 st.write("Upload a plant leaf image to diagnose nutrient deficiency.")
 
 uploaded_file = st.file_uploader("Upload Image", type=["jpg", "jpeg", "png"])
 
-def process_image(image):
-    image = image.convert("RGB")
-    image = image.resize((256, 256))  # تأكد من أن هذا هو الحجم المطلوب
-    img_array = np.array(image) / 255.0
-    img_array = np.expand_dims(img_array, axis=0).astype(np.float32)
-    return img_array
+# مخزن إدخال بصيغة NHWC يُعاد استخدامه بدلًا من إنشاء مصفوفات مؤقتة في كل مرة؛
+# يُخزَّن بـ cache_resource ليبقى عبر كل rerun، ولا يُكتب فيه إلا تحت interpreter_lock
+@st.cache_resource
+def get_input_buffers():
+    return np.empty((1, 256, 256, 3), np.float32), np.empty((1, 256, 256, 3), np.int8)
 
-if uploaded_file:
-    image = Image.open(uploaded_file)
-    st.image(image, caption="Uploaded Image", use_column_width=True)
-    try:
-        processed = process_image(image)
+_INBUF, _QBUF = get_input_buffers()
+
+def process_image(raw_bytes):
+    arr = decode_image(raw_bytes)  # تأكد من أن 256x256 هو الحجم المطلوب
+    if input_details[0]['dtype'] != np.int8:
+        np.multiply(arr, np.float32(1 / 255.0), out=_INBUF[0], casting='unsafe')
+        return _INBUF
+    # النموذج المكمّم (INT8) يتوقع مدخلات int8 حسب (scale, zero_point)
+    scale, zero_point = input_details[0]['quantization']
+    np.multiply(arr, np.float32(1 / (255.0 * scale)), out=_INBUF[0], casting='unsafe')
+    np.add(_INBUF, zero_point, out=_INBUF)
+    np.rint(_INBUF, out=_INBUF)
+    np.clip(_INBUF, -128, 127, out=_INBUF)
+    np.copyto(_QBUF, _INBUF, casting='unsafe')
+    return _QBUF
+
+# نتيجة التنبؤ تُخزَّن حسب محتوى الصورة، فلا يُعاد تشغيل النموذج عند إعادة رسم الواجهة لنفس الصورة
+@st.cache_data(show_spinner=False)
+def predict_bytes(raw_bytes):
+    # النتيجة تُخزَّن لكل المستخدمين، لذلك تُحسب كاملة (المعالجة + التنبؤ) تحت القفل
+    with interpreter_lock:
+        processed = process_image(raw_bytes)
         interpreter.set_tensor(input_details[0]['index'], processed)
         interpreter.invoke()
-        prediction = interpreter.get_tensor(output_details[0]['index'])[0]
-        class_index = np.argmax(prediction)
-        confidence = float(np.max(prediction)) * 100
+        # tensor() يعيد عرضًا (view) على ذاكرة المفسّر بدون نسخ؛ يُقرأ فورًا قبل أي invoke آخر
+        prediction = interpreter.tensor(output_details[0]['index'])()[0]
+        class_index = int(prediction.argmax())
+        # في النموذج المكمّم يكفي تحويل العنصر المختار فقط إلى float
+        if output_details[0]['dtype'] == np.int8:
+            scale, zero_point = output_details[0]['quantization']
+            confidence = (int(prediction[class_index]) - zero_point) * scale * 100.0
+        else:
+            confidence = float(prediction[class_index]) * 100.0
+        # تحرير العرض قبل فك القفل، وإلا يرفض invoke التالي العمل بسبب مرجع حي لذاكرة المفسّر
+        del prediction
+    return class_index, confidence
+
+if uploaded_file:
+    st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
+    try:
+        class_index, confidence = predict_bytes(uploaded_file.getvalue())
         classes = ["Healthy Leaf", "Nitrogen Deficiency", "Zinc Deficiency"]
         result = classes[class_index]
         st.success(f"🧪 Prediction: {result}")
@@ -1,14 +1,74 @@
+import argparse
+import os
+import random
+
+import numpy as np
 import tensorflow as tf
 
+from preprocessing import decode_image
+
+NUM_CALIBRATION_IMAGES = 100
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+IMAGE_SIZE = (256, 256)
+# شكل الإدخال ثابت كما يستخدمه app.py، ليُبنى النموذج بأبعاد محددة بدل الأبعاد الديناميكية
+INPUT_SHAPE = (1, *IMAGE_SIZE, 3)
+
+
+def representative_dataset(dataset_dir):
+    # عيّنة ثابتة موزّعة على كل الصور (وليس أول 100 مسار، التي تكون غالبًا من مجلد فئة واحدة)
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(dataset_dir)
+        for name in names
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not paths:
+        raise FileNotFoundError(f"No calibration images found in '{dataset_dir}'.")
+    paths = random.Random(0).sample(paths, min(NUM_CALIBRATION_IMAGES, len(paths)))
+    # نفس المعالجة المستخدمة في app.py (decode_image): RGB بحجم 256x256 وقيم float32 بين 0 و 1
+    for path in paths:
+        with open(path, "rb") as f:
+            img_array = decode_image(f.read()).astype(np.float32) / 255.0
+        yield [np.expand_dims(img_array, axis=0)]
+
+
+parser = argparse.ArgumentParser(description="Convert model.h5 to model.tflite")
+parser.add_argument(
+    "--quantization",
+    choices=("int8", "float16"),
+    default="int8",
+    help="int8: full-integer model for CPU; float16: half-size weights for the GPU delegate (see TFLITE_GPU_DELEGATE in app.py)",
+)
+parser.add_argument(
+    "--dataset-dir",
+    default="dataset",
+    help="folder of real leaf images (searched recursively) used to calibrate int8 quantization",
+)
+args = parser.parse_args()
+
 # تحميل النموذج
 model = tf.keras.models.load_model("model.h5")
 
-# تحويل النموذج إلى TFLite
+# إعادة بناء النموذج على مدخل بحجم دفعة ثابت (1) بدل البعد الديناميكي
+inputs = tf.keras.Input(batch_size=INPUT_SHAPE[0], shape=INPUT_SHAPE[1:])
+model = tf.keras.Model(inputs, model(inputs))
+
 converter = tf.lite.TFLiteConverter.from_keras_model(model)
+converter.optimizations = [tf.lite.Optimize.DEFAULT]
+if args.quantization == "int8":
+    # تكميم كامل إلى INT8؛ المكمّم المبني على MLIR هو الافتراضي أصلًا ونثبّته هنا صراحةً فقط
+    converter.experimental_new_quantizer = True
+    converter.representative_dataset = lambda: representative_dataset(args.dataset_dir)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+else:
+    # أوزان float16: نصف الحجم ومتوافق مع GPU delegate
+    converter.target_spec.supported_types = [tf.float16]
 tflite_model = converter.convert()
 
 # حفظ النموذج الجديد
 with open("model.tflite", "wb") as f:
     f.write(tflite_model)
 
-print("✅ تم تحويل النموذج إلى model.tflite بنجاح.")
\ No newline at end of file
+print("✅ تم تحويل النموذج إلى model.tflite بنجاح.")
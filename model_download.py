@@ -0,0 +1,38 @@
+import hashlib
+import logging
+import os
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def download_model(url, path, sha256):
+    # التنزيل إلى ملف مؤقت؛ لا يُستكمل ملف .part منقطع عبر Range إلا إذا كانت البصمة معروفة للتحقق منه
+    part_path = path + ".part"
+    if not sha256:
+        logger.warning("MODEL_SHA256 is not set; downloading %s without checksum verification", url)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=30) as r:
+        # 416: الملف المؤقت مكتمل أصلًا (مثلًا توقفت العملية قبل os.replace)؛ يُتحقق منه بالبصمة أدناه
+        if r.status_code != 416:
+            r.raise_for_status()
+            # Google Drive يعيد صفحة HTML (خطأ أو تحذير فحص الفيروسات) بدل الملف أحيانًا
+            if r.headers.get("Content-Type", "").startswith("text/html"):
+                raise ValueError("Model URL returned an HTML page instead of the model file")
+            with open(part_path, "ab" if r.status_code == 206 else "wb") as f:
+                for chunk in r.iter_content(1 << 20):
+                    f.write(chunk)
+    if sha256 and file_sha256(part_path) != sha256:
+        os.remove(part_path)
+        raise ValueError("SHA256 mismatch for downloaded model")
+    os.replace(part_path, path)
@@ -0,0 +1,22 @@
+import cv2
+import numpy as np
+import simplejpeg
+
+# فك ترميز الصورة وتصغيرها إلى 256x256 بصيغة RGB (uint8)؛ يستخدمه app.py و convert_to_tflite.py
+# حتى تكون صور معايرة التكميم معالجة بنفس طريقة صور التطبيق تمامًا
+def decode_image(raw_bytes):
+    # JPEG: فك ترميز سريع بـ simplejpeg (libjpeg-turbo) مع تصغير أثناء فك الترميز
+    if raw_bytes[:3] == b'\xff\xd8\xff':
+        try:
+            arr = simplejpeg.decode_jpeg(
+                raw_bytes, colorspace='RGB', fastdct=True, fastupsample=True, min_height=256, min_width=256
+            )
+            return cv2.resize(arr, (256, 256), interpolation=cv2.INTER_AREA)
+        except ValueError:
+            pass  # مثلًا JPEG بصيغة CMYK: نعود إلى OpenCV
+    # باقي الصيغ (PNG): فك الترميز والتحويل وتغيير الحجم بـ OpenCV (SIMD ومتعدد الخيوط)
+    bgr = cv2.imdecode(np.frombuffer(raw_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError("Unsupported or corrupt image file")
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    return cv2.resize(rgb, (256, 256), interpolation=cv2.INTER_AREA)
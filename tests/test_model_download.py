@@ -0,0 +1,99 @@
+import hashlib
+
+import pytest
+
+import model_download
+
+MODEL = b"TFL3" + bytes(range(256)) * 64
+MODEL_SHA256 = hashlib.sha256(MODEL).hexdigest()
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", content_type="application/octet-stream"):
+        self.status_code = status_code
+        self.headers = {"Content-Type": content_type}
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise model_download.requests.HTTPError(str(self.status_code))
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._body), chunk_size):
+            yield self._body[i:i + chunk_size]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Serves MODEL over a fake requests.get that honours Range and records request headers."""
+    requests_seen = []
+    state = {"content_type": "application/octet-stream"}
+
+    def fake_get(url, headers=None, **kwargs):
+        headers = headers or {}
+        requests_seen.append(headers)
+        if "Range" in headers:
+            start = int(headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(MODEL):
+                return FakeResponse(416)
+            return FakeResponse(206, MODEL[start:], state["content_type"])
+        return FakeResponse(200, MODEL, state["content_type"])
+
+    monkeypatch.setattr(model_download.requests, "get", fake_get)
+    state["requests"] = requests_seen
+    return state
+
+
+def test_full_download(tmp_path, server):
+    path = tmp_path / "model.tflite"
+    model_download.download_model("http://x/model", str(path), MODEL_SHA256)
+    assert path.read_bytes() == MODEL
+    assert server["requests"] == [{}]
+    assert not (tmp_path / "model.tflite.part").exists()
+
+
+def test_resumes_partial_download_with_digest(tmp_path, server):
+    path = tmp_path / "model.tflite"
+    (tmp_path / "model.tflite.part").write_bytes(MODEL[:1000])
+    model_download.download_model("http://x/model", str(path), MODEL_SHA256)
+    assert path.read_bytes() == MODEL
+    assert server["requests"] == [{"Range": "bytes=1000-"}]
+
+
+def test_accepts_complete_part_on_416_when_digest_matches(tmp_path, server):
+    path = tmp_path / "model.tflite"
+    (tmp_path / "model.tflite.part").write_bytes(MODEL)
+    model_download.download_model("http://x/model", str(path), MODEL_SHA256)
+    assert path.read_bytes() == MODEL
+
+
+def test_rejects_oversized_part_on_416(tmp_path, server):
+    path = tmp_path / "model.tflite"
+    part = tmp_path / "model.tflite.part"
+    part.write_bytes(MODEL + b"stale")
+    with pytest.raises(ValueError, match="SHA256"):
+        model_download.download_model("http://x/model", str(path), MODEL_SHA256)
+    assert not path.exists()
+    assert not part.exists()
+
+
+def test_restarts_instead_of_resuming_without_digest(tmp_path, server):
+    path = tmp_path / "model.tflite"
+    (tmp_path / "model.tflite.part").write_bytes(b"stale bytes from another file")
+    model_download.download_model("http://x/model", str(path), "")
+    assert path.read_bytes() == MODEL
+    assert server["requests"] == [{}]
+
+
+def test_rejects_html_page(tmp_path, server):
+    server["content_type"] = "text/html; charset=utf-8"
+    path = tmp_path / "model.tflite"
+    with pytest.raises(ValueError, match="HTML"):
+        model_download.download_model("http://x/model", str(path), "")
+    assert not path.exists()